@@ -1,6 +1,35 @@
+import atexit
+import os
+import tempfile
 import typer
 import httpx
-import os
+from pathlib import Path
+
+
+_client: httpx.Client | None = None
+
+
+def get_client() -> httpx.Client:
+    """
+    Return the shared HTTP client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        _client = httpx.Client(timeout=30.0, transport=httpx.HTTPTransport(retries=2))
+        atexit.register(_client.close)
+    return _client
+
+
+def _file_mode(path: str) -> int:
+    """
+    Return the permissions of an existing file, or the default ones for a new file.
+    """
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
 
 
 def generate(url: str, output: str):
@@ -13,11 +42,23 @@ def generate(url: str, output: str):
         client_url = url
 
     try:
-        response = httpx.get(client_url)
-        response.raise_for_status()
-        os.makedirs(os.path.dirname(output), exist_ok=True)
-        with open(output, "wb") as f:
-            f.write(response.content)
+        with get_client().stream("GET", client_url) as response:
+            response.raise_for_status()
+            directory = Path(output).parent
+            directory.mkdir(parents=True, exist_ok=True)
+            # Replace output only once the whole file has arrived, so that a failed
+            # download leaves any previous version intact.
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".fastroutes-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_bytes(65536):
+                        f.write(chunk)
+                # mkstemp creates the file readable by its owner only.
+                os.chmod(temp_path, _file_mode(output))
+                os.replace(temp_path, output)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
         typer.secho(f"✅ File saved to {output}", fg=typer.colors.GREEN)
     except httpx.HTTPError as e:
         typer.secho(f"❌ Failed to fetch client code: {e}", fg=typer.colors.RED)
@@ -1,17 +1,54 @@
+import ast
+import hashlib
+import re
 import textwrap
-from collections import defaultdict
-from io import BytesIO
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+from collections.abc import Iterator
+from functools import cache, cached_property
+from fastapi import FastAPI, Header
+from fastapi.responses import Response
 from pydantic import BaseModel
-from pydantic._internal._model_construction import ModelMetaclass
 import inspect
-from typing import get_origin, get_args
+import linecache
+from types import UnionType
+from typing import Annotated, Union, get_origin, get_args
 from .route import Route
-from .helpers import get_model_name
+from .helpers import get_model_name, extract_parents, get_models_from_fields, is_model, order_by_dependencies
 from dataclasses import dataclass
 
 
+_CONTAINER_ORIGINS = frozenset({list, dict, tuple, set, frozenset, Union, UnionType})
+
+
+@cache
+def _parse_source_file(path: str) -> tuple[ast.Module, list[str]]:
+    source = "".join(linecache.getlines(path))
+    return ast.parse(source, path), source.splitlines()
+
+
+def _find_class_node(tree: ast.Module, cls: type) -> ast.ClassDef:
+    first_line = getattr(cls, "__firstlineno__", None)
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ClassDef) or node.name != cls.__name__:
+            continue
+        node_first_line = min([node.lineno, *(d.lineno for d in node.decorator_list)])
+        if first_line is None or node_first_line == first_line:
+            return node
+    raise OSError(f"could not find class definition for {cls.__qualname__}")
+
+
+@cache
+def _strip_decorators_from_source(cls: type) -> str:
+    tree, lines = _parse_source_file(inspect.getsourcefile(cls))
+    node = _find_class_node(tree, cls)
+    end = node.end_lineno
+    for statement in node.body:
+        decorators = getattr(statement, "decorator_list", None)
+        if decorators or isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            end = min([statement.lineno, *(d.lineno for d in decorators)]) - 1
+            break
+    return "\n".join(lines[node.lineno - 1 : end])
+
+
 @dataclass(frozen=True)
 class Model:
     name: str
@@ -24,6 +61,47 @@ class FastRoutes:
         self.app = app
         self.routes = Route.extract(app, paths_to_exclude=paths_to_exclude)
         self.name = name
+        self._imports_chunk = self.get_imports().encode("utf-8")
+        self._client_class_chunk = self.get_client_class().encode("utf-8")
+        self._candidate_models = self.get_candidate_models(self.routes)
+        self.preload_sources(self._candidate_models)
+
+    @staticmethod
+    def get_candidate_models(routes: list[Route]) -> list[type[BaseModel]]:
+        """
+        Collect the models used directly by the routes, unwrapping container and union types.
+        """
+        candidates = {}
+        for route in routes:
+            for return_type in route.return_types:
+                if get_origin(return_type) in _CONTAINER_ORIGINS:
+                    rts = get_args(return_type)
+                else:
+                    rts = (return_type,)
+                for rt in rts:
+                    if is_model(rt):
+                        candidates[rt] = None
+        return list(candidates)
+
+    @staticmethod
+    def preload_sources(models: list[type[BaseModel]]) -> None:
+        """
+        Parse every source file defining the given models or the models they reference, once.
+        """
+        related = {
+            related_model
+            for model in models
+            for field_model in (model, *get_models_from_fields(model))
+            for related_model in (field_model, *extract_parents(field_model))
+        }
+        paths = set()
+        for model in related:
+            try:
+                paths.add(inspect.getsourcefile(model))
+            except TypeError:
+                continue
+        for path in paths - {None}:
+            _parse_source_file(path)
 
     @staticmethod
     def get_imports():
@@ -38,110 +116,58 @@ class FastRoutes:
         )
 
     def get_models(self) -> str:
-        def extract_parents(model: BaseModel, models_to_export: list[BaseModel] = None):
-            if models_to_export is None:
-                models_to_export = []
-            parent = model.__base__
-            if parent is BaseModel:
-                return models_to_export
-            return extract_parents(parent, [parent] + models_to_export)
-
-        def get_models_from_fields(model: BaseModel, models=None) -> list[BaseModel]:
-            """
-            Recursively extract all models from the fields of a given model.
-            """
-            if models is None:
-                models = []
-            for field in model.model_fields.values():
-                if isinstance(field.annotation, ModelMetaclass):
-                    models.append(field.annotation)
-                    models = get_models_from_fields(field.annotation, models)
-                elif get_origin(field.annotation) is list:
-                    list_element = list(get_args(field.annotation))[0]
-                    if isinstance(list_element, ModelMetaclass):
-                        models.append(list_element)
-                        models = get_models_from_fields(list_element, models)
-
-            return models
-
         all_models = {}
-        relationships = defaultdict(list[str])
+        relationships = {}
         mapping = {}
-        base_models = {}
-        for route in self.routes:
-            for return_type in route.return_types:
-                if get_origin(return_type) is list:
-                    rts = list(get_args(return_type))
-                elif get_origin(return_type) is dict:
-                    rts = list(get_args(return_type))
-                else:
-                    rts = [return_type]
-                for rt in rts:
-                    if isinstance(rt, ModelMetaclass):
-                        models_in_model = get_models_from_fields(rt)
-                        models_in_model = models_in_model + [item for list in [extract_parents(mim) for mim in models_in_model + [rt]] for item in list] + [rt]
-                        for relevant_model in models_in_model:
-                            model_name = get_model_name(relevant_model)
-                            all_models[model_name] = Model(
-                                model_name,
-                                self.strip_decorators_from_source(relevant_model).replace(
-                                    f"class {relevant_model.__name__}", f"class {model_name}"
-                                ),
-                                get_model_name(relevant_model.__base__),
-                            )
-                            base_models[model_name] = relevant_model
-                            mapping[relevant_model.__name__] = model_name
-        for model_name, model in base_models.items():
-            parent_model_name = get_model_name(model.__base__)
-            models_in_model = get_models_from_fields(model)
-            relationships[model_name] = [get_model_name(m) for m in models_in_model] + [parent_model_name]
-
-        correct_order = []
-
-        def add_to_order(model_name: str) -> None:
-            """
-            Add a model to the order list, ensuring no duplicates.
-            """
-            if model_name not in correct_order:
-                correct_order.append(model_name)
-            for model, dependencies in relationships.items():
-                new_dependencies = [ dep for dep in dependencies if dep != model_name ]
-                relationships[model] = new_dependencies
-
-        add_to_order("PydanticMainBaseModel")
-        while True:
-            ready = [model for model, deps in relationships.items() if not deps and model not in correct_order]
-            if not ready:
-                break
-            for model in ready:
-                add_to_order(model)
-
-        models_code = ""
-        for model_name in correct_order[1:]:
-            model = all_models[model_name]
-            models_code += model.code + "\n\n"
-
-        for old_value, new_value in mapping.items():
-            models_code = models_code.replace(
-                f"({old_value})", f"({new_value})"
-            ).replace(f": {old_value}", f": {new_value}").replace(f"[{old_value}]", f"[{new_value}]")
-        return models_code + "\n\n\n"
+        for rt in self._candidate_models:
+            models_in_model = get_models_from_fields(rt)
+            models_in_model = [*models_in_model, *(parent for mim in models_in_model + (rt,) for parent in extract_parents(mim)), rt]
+            for relevant_model in models_in_model:
+                model_name = get_model_name(relevant_model)
+                if model_name in all_models:
+                    continue
+                parent_model_name = get_model_name(relevant_model.__base__)
+                all_models[model_name] = Model(
+                    model_name,
+                    self.strip_decorators_from_source(relevant_model).replace(
+                        f"class {relevant_model.__name__}", f"class {model_name}"
+                    ),
+                    parent_model_name,
+                )
+                relationships[model_name] = [
+                    get_model_name(m) for m in get_models_from_fields(relevant_model)
+                ] + [get_model_name(base) for base in relevant_model.__bases__ if is_model(base)]
+                mapping[relevant_model.__name__] = model_name
+
+        correct_order = order_by_dependencies(relationships, satisfied="PydanticMainBaseModel")
+
+        # A single pass renames every model referenced as an annotation ": Name",
+        # or as an entry "(Name", "[Name" or ", Name" of a base class or type
+        # argument list. List entries must be followed by a closing bracket, a
+        # separator or "|", so that text such as "(Name sample)" inside string
+        # defaults is left alone.
+        names = "|".join(re.escape(name) for name in sorted(mapping, key=len, reverse=True))
+        rename = re.compile(
+            rf"(?:(?<=[(\[])|(?<=, ))({names})(?=\s*[\]),\[|])|(?<=: )({names})\b"
+        )
+
+        parts: list[str] = []
+        for model_name in correct_order:
+            code = rename.sub(
+                lambda match: mapping[match.group(1) or match.group(2)],
+                all_models[model_name].code,
+            )
+            parts.append(code)
+            parts.append("\n\n")
+        parts.append("\n\n\n")
+        return "".join(parts)
 
     @staticmethod
     def strip_decorators_from_source(cls: type) -> str:
-        src = inspect.getsource(cls)
-        lines = []
-        for line in src.splitlines():
-            if line.lstrip().startswith("@") or line.lstrip().startswith("def "):
-                break
-            lines.append(line)
-        return "\n".join(lines)
+        return _strip_decorators_from_source(cls)
 
     def get_handlers(self) -> str:
-        handlers_code = ""
-        for route in self.routes:
-            handlers_code += route.handler + "\n\n"
-        return handlers_code
+        return "".join(route.handler + "\n\n" for route in self.routes)
 
     def get_client_class(self) -> str:
         class_code = (
@@ -160,21 +186,38 @@ class FastRoutes:
         )
         return class_code
 
+    def iter_code_chunks(self) -> Iterator[bytes]:
+        yield self._imports_chunk
+        yield self.get_models().encode("utf-8")
+        yield self._client_class_chunk
+        for route in self.routes:
+            yield textwrap.indent(route.handler + "\n\n", "    ").encode("utf-8")
+
+    @cached_property
+    def exported_code(self) -> bytes:
+        """
+        The generated client file, built once since the app routes do not change.
+        """
+        return b"".join(self.iter_code_chunks())
+
+    @cached_property
+    def etag(self) -> str:
+        return f'"{hashlib.sha256(self.exported_code).hexdigest()}"'
+
     def export_code(self) -> str:
-        imports = self.get_imports()
-        models = self.get_models()
-        client_class = self.get_client_class()
-        handlers = self.get_handlers()
-        return imports + models + client_class + textwrap.indent(handlers, "    ")
+        return self.exported_code.decode("utf-8")
 
     def add_route_to_fastapi(self):
         @self.app.get("/fastroutes", include_in_schema=False)
-        async def get_fastroutes():
-            content = self.export_code()
-            file_like = BytesIO(content.encode("utf-8"))
+        async def get_fastroutes(if_none_match: Annotated[str | None, Header()] = None):
             headers = {
                 "Content-Disposition": f"attachment; filename={self.name.lower()}.py",
+                "ETag": self.etag,
+                "Cache-Control": "no-cache",
             }
-            return StreamingResponse(
-                file_like, media_type="text/x-python", headers=headers
-            )
+            if if_none_match and (
+                if_none_match.strip() == "*"
+                or self.etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+            ):
+                return Response(status_code=304, headers=headers)
+            return Response(self.exported_code, media_type="text/x-python", headers=headers)
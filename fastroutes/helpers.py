@@ -1,9 +1,137 @@
+from collections.abc import Iterator
+from functools import cache, lru_cache
+from itertools import accumulate
+from typing import Any, get_origin, get_args
 from pydantic import BaseModel
-from pydantic._internal._model_construction import ModelMetaclass
 
 
-def get_model_name(return_type: BaseModel | ModelMetaclass):
+# Keyed by identity rather than equality: equal annotations can still be spelled
+# differently, e.g. `int | None` and `Optional[int]`, or `Union[None, int]` and
+# `Union[int, None]`, but they are distinct objects. Each entry keeps its
+# annotation alive so that the id cannot be reused.
+_ORIGIN_ARGS: dict[int, tuple[Any, Any, tuple[Any, ...]]] = {}
+
+
+def get_origin_args(annotation: Any) -> tuple[Any, tuple[Any, ...]]:
+    """
+    Return get_origin and get_args of an annotation, memoized per annotation object.
+    """
+    entry = _ORIGIN_ARGS.get(id(annotation))
+    if entry is None:
+        entry = _ORIGIN_ARGS[id(annotation)] = (annotation, get_origin(annotation), get_args(annotation))
+    return entry[1], entry[2]
+
+
+def is_model(annotation: object) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+@cache
+def get_model_name(return_type: type[BaseModel]):
     return (
         "".join(word.capitalize() for word in return_type.__module__.split("."))
         + return_type.__name__
     )
+
+
+@lru_cache(maxsize=1024)
+def _model_name_or_none(annotation: Any) -> str | None:
+    return get_model_name(annotation) if is_model(annotation) else None
+
+
+def model_name_or_none(annotation: Any) -> str | None:
+    """
+    Return the generated name of a pydantic model, or None for any other annotation.
+    """
+    try:
+        return _model_name_or_none(annotation)
+    except TypeError:
+        # Unhashable annotations are never model classes.
+        return None
+
+
+@cache
+def extract_parents(model: type[BaseModel]) -> tuple[type[BaseModel], ...]:
+    """
+    Return the pydantic ancestors of a model, from the root-most one down to its direct parent.
+    """
+    return tuple(
+        base
+        for base in reversed(model.__mro__[1:])
+        if base is not BaseModel and issubclass(base, BaseModel)
+    )
+
+
+def _iter_field_models(model: type[BaseModel]) -> Iterator[type[BaseModel]]:
+    for field in model.model_fields.values():
+        annotation = field.annotation
+        if is_model(annotation):
+            yield annotation
+        elif get_origin(annotation) is list:
+            field_model = get_args(annotation)[0]
+            if is_model(field_model):
+                yield field_model
+
+
+@cache
+def get_models_from_fields(model: type[BaseModel]) -> tuple[type[BaseModel], ...]:
+    """
+    Extract all models reachable from the fields of a given model, depth first and without duplicates.
+    """
+    models = []
+    seen = {model}
+    stack = [_iter_field_models(model)]
+    while stack:
+        for field_model in stack[-1]:
+            if field_model not in seen:
+                seen.add(field_model)
+                models.append(field_model)
+                stack.append(_iter_field_models(field_model))
+                break
+        else:
+            stack.pop()
+    return tuple(models)
+
+
+def order_by_dependencies(dependencies: dict[str, list[str]], satisfied: str) -> list[str]:
+    """
+    Order names so that each comes after everything it depends on, using Kahn's algorithm.
+
+    Names are released one frontier at a time, in their original order, and the ones
+    whose dependencies can never be met (unknown names or cycles) are left out.
+    """
+    names = list(dependencies)
+    ids = {name: index for index, name in enumerate(names)}
+    pending = [0] * len(names)
+    known_dependencies = []
+    counts = [0] * (len(names) + 1)
+    for index, names_needed in enumerate(dependencies.values()):
+        unresolved = {name for name in names_needed if name != satisfied}
+        pending[index] = len(unresolved)
+        known = [ids[name] for name in unresolved if name in ids]
+        known_dependencies.append(known)
+        for dependency in known:
+            counts[dependency + 1] += 1
+
+    # Dependants of name i are dependants[offsets[i]:offsets[i + 1]], in ascending order.
+    offsets = list(accumulate(counts))
+    dependants = [0] * offsets[-1]
+    cursor = offsets[:-1]
+    for index, known in enumerate(known_dependencies):
+        for dependency in known:
+            dependants[cursor[dependency]] = index
+            cursor[dependency] += 1
+
+    order = []
+    ready = [index for index, count in enumerate(pending) if not count]
+    while ready:
+        order.extend(ready)
+        unlocked = []
+        for index in ready:
+            for dependant in dependants[offsets[index] : offsets[index + 1]]:
+                pending[dependant] -= 1
+                if not pending[dependant]:
+                    unlocked.append(dependant)
+        unlocked.sort()
+        ready = unlocked
+    return [names[index] for index in order]
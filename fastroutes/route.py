@@ -2,17 +2,41 @@ from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from pydantic_core import PydanticUndefined
 from pydantic import BaseModel
-from pydantic._internal._model_construction import ModelMetaclass
 import textwrap
-from dataclasses import dataclass
-from typing import Any, Literal, get_origin, get_args, Union
+from dataclasses import dataclass, field
+from functools import cached_property
+from operator import attrgetter
+from typing import Any, Literal, NamedTuple, Union
 from types import NoneType
-from .helpers import get_model_name
+from weakref import WeakValueDictionary
+from .helpers import get_origin_args, model_name_or_none
 from datetime import datetime
 
 
 PARAMETER_UNDEFINED = "_PARAMETER_UNDEFINED"
 METHOD = Literal["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"]
+HANDLER_TEMPLATE = (
+    "async def {name}(self, {params}) -> {signature}:\n"
+    "{docstring}\n"
+    "    url = {url}\n"
+    "    params = {query}\n"
+    "    payload = {payload}\n"
+    '    api_response = await self._client.request("{method}", url, json=payload, params=params)\n'
+    "    api_response.raise_for_status()\n"
+    "{result}"
+)
+RESULT_TEMPLATE = "    response_body = api_response.json()\n    return {}"
+RESULT_VALUES = {"list": "resp_object", "dict": "value", "scalar": "response_body"}
+METHOD_PRIORITY: dict[METHOD, int] = {
+    "GET": 0,
+    "POST": 1,
+    "DELETE": 2,
+    "PUT": 3,
+    "PATCH": 4,
+    "HEAD": 5,
+    "OPTIONS": 6,
+}
+KNOWN_METHODS = frozenset(METHOD_PRIORITY)
 
 
 @dataclass(frozen=True)
@@ -21,33 +45,56 @@ class Parameter:
     type: type[Any]
     required: bool
     default: Any = PARAMETER_UNDEFINED
+    _key: tuple = field(init=False, repr=False, compare=False)
+    _hash_key: tuple = field(init=False, repr=False, compare=False)
+    needs_isoformat: bool = field(init=False, repr=False, compare=False)
+    required_sort: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_key", (self.alias, self.type, self.required, self.default))
+        object.__setattr__(self, "_hash_key", self._key[:3])
+        object.__setattr__(self, "needs_isoformat", self.type is datetime)
+        object.__setattr__(self, "required_sort", 0 if self.required else 1)
+
+    @classmethod
+    def intern(cls, alias: str, type_: type[Any], required: bool, default: Any = PARAMETER_UNDEFINED) -> "Parameter":
+        """
+        Return the shared instance for these values, creating it if needed.
+        """
+        # Keyed by identity: equal annotations or defaults may still render differently,
+        # e.g. `Optional[list[int]]` and `list[int] | None`, or 0 and False. The
+        # instance keeps type_ and default alive, so their ids stay valid for as long
+        # as its entry exists.
+        key = (alias, id(type_), required, id(default))
+        parameter = _PARAMETERS.get(key)
+        if parameter is None:
+            parameter = _PARAMETERS[key] = cls(alias, type_, required, default)
+        return parameter
 
     def __hash__(self):
-        return hash((self.alias, self.type, self.required))
+        return hash(self._hash_key)
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Parameter):
             return NotImplemented
-        return (self.alias, self.type, self.required, self.default) == (
-            other.alias,
-            other.type,
-            other.required,
-            other.default,
-        )
+        return self._key == other._key
 
     def __str__(self):
         type_ = self.type
-        origin = get_origin(type_)
-        args = get_args(type_)
+        origin, args = get_origin_args(type_)
 
+        # Plain classes such as int, str or UUID are by far the most common parameters.
         if origin is None:
-            type_repr = type_.__name__
-        elif origin is Union:
+            if self.default != PARAMETER_UNDEFINED:
+                return f"{self.alias}: {type_.__name__} = {self.default!r}"
+            return f"{self.alias}: {type_.__name__}"
+
+        if origin is Union:
             type_repr = " | ".join(t.__name__ for t in args).replace("NoneType", "None")
         elif origin is list:
             if len(args) == 1:
-                if isinstance(args[0], ModelMetaclass):
-                    model_name = get_model_name(args[0])
+                model_name = model_name_or_none(args[0])
+                if model_name is not None:
                     type_repr = f"list[{model_name}]"
                 else:
                     type_repr = str(type_).replace("datetime.datetime", "datetime")
@@ -60,6 +107,48 @@ class Parameter:
         return f"{self.alias}: {type_repr}"
 
 
+_PARAMETERS: WeakValueDictionary[tuple, Parameter] = WeakValueDictionary()
+
+
+class Signature(NamedTuple):
+    text: str
+    kind: Literal["none", "scalar", "list", "dict"]
+    # Expression deserializing each value, or None to return values as they are.
+    inner: str | None
+    # Whether values are passed to `inner` as keyword arguments (pydantic models).
+    unpack: bool = False
+
+
+def _list_signature(response: Any, args: tuple[Any, ...]) -> Signature:
+    return_type = args[0]
+    model_name = model_name_or_none(return_type)
+    if model_name is not None:
+        return Signature(f"list[{model_name}]", "list", model_name, unpack=True)
+    inner_origin, inner_args = get_origin_args(return_type)
+    if inner_origin is Literal:
+        literal = f"Literal[{', '.join(f"'{str(arg)}'" for arg in inner_args)}]"
+        return Signature(f"list[{literal}]", "list", None)
+    return Signature(f"list[{return_type.__name__}]", "list", return_type.__name__)
+
+
+def _dict_signature(response: Any, args: tuple[Any, ...]) -> Signature:
+    key_type, return_type = args
+    model_name = model_name_or_none(return_type)
+    if model_name is not None:
+        return Signature(f"dict[{key_type.__name__}, {model_name}]", "dict", model_name, unpack=True)
+    return Signature(f"dict[{key_type.__name__}, {return_type.__name__}]", "dict", return_type.__name__)
+
+
+def _scalar_signature(response: Any, args: tuple[Any, ...]) -> Signature:
+    model_name = model_name_or_none(response)
+    if model_name is not None:
+        return Signature(model_name, "scalar", model_name, unpack=True)
+    return Signature(response.__name__, "scalar", response.__name__)
+
+
+SIGNATURE_BUILDERS = {list: _list_signature, dict: _dict_signature}
+
+
 @dataclass
 class Route:
     index: int
@@ -72,210 +161,128 @@ class Route:
     query_parameters: list[Parameter]
     response: Any
 
-    @property
+    @cached_property
     def return_types(self):
         return (
             [self.body] + self.path_parameters + self.query_parameters + [self.response]
         )
 
-    @property
+    @cached_property
     def body_parameters(self):
         if not self.body:
             return []
-        return [
-            Parameter(
+        fields = self.body.model_fields
+        parameters = [None] * len(fields)
+        for index, (name, info) in enumerate(fields.items()):
+            default = info.default
+            parameters[index] = Parameter.intern(
                 name,
                 info.annotation,
                 info.is_required(),
-                info.default
-                if info.default is not PydanticUndefined
-                else PARAMETER_UNDEFINED,
+                PARAMETER_UNDEFINED if default is PydanticUndefined else default,
             )
-            for name, info in self.body.model_fields.items()
-        ]
+        return parameters
 
-    @property
+    @cached_property
     def response_signature(self):
-        if get_origin(self.response) is list:
-            return_type = get_args(self.response)[0]
-
-            if isinstance(return_type, ModelMetaclass):
-                model_name = get_model_name(return_type)
-                return f"list[{model_name}]"
-            elif get_origin(return_type) is Literal:
-                return f"list[Literal[{', '.join(f"'{str(arg)}'" for arg in get_args(return_type))}]]"
-            return f"list[{return_type.__name__}]"
-
-        elif get_origin(self.response) is dict:
-            rt = get_args(self.response)
-            return_type = rt[1]
-            if isinstance(return_type, ModelMetaclass):
-                model_name = get_model_name(return_type)
-                return f"dict[{rt[0].__name__}, {model_name}]"
-            return f"dict[{rt[0].__name__}, {rt[1].__name__}]"
-        elif self.response is None:
-            return "None"
-        else:
-            if isinstance(self.response, ModelMetaclass):
-                model_name = get_model_name(self.response)
-                return model_name
-            return_type = self.response
-            return f"{return_type.__name__}"
+        response = self.response
+        if response is None:
+            return Signature("None", "none", None)
+        origin, args = get_origin_args(response)
+        return SIGNATURE_BUILDERS.get(origin, _scalar_signature)(response, args)
 
-    @property
+    @cached_property
     def handler(self):
         params = ", ".join(
             str(param)
             for param in sorted(
                 self.body_parameters + self.path_parameters + self.query_parameters,
-                key=lambda p: not p.required,
+                key=attrgetter("required_sort"),
             )
         )
-        signature = (
-            f"""async def {self.name}(self, {params}) -> {self.response_signature}:\n"""
-        )
-        docstring = textwrap.indent(f'"""{self.description}"""', "    ")
-
-        url_body = textwrap.indent(
-            f"url = {'f' if self.path_parameters else ''}'{self.path}'", "    "
-        )
-        params_dict = ", ".join(
+        query_dict = ", ".join(
             f'"{query_param.alias}":{query_param.alias}'
             for query_param in self.query_parameters
         )
-        if self.query_parameters:
-            params_body = textwrap.indent(f"params = {{{params_dict}}}", "    ")
-        else:
-            params_body = textwrap.indent("params = None", "    ")
         payload_dict = ", ".join(
-            f'"{body_param.alias}":{body_param.alias}{".isoformat()" if body_param.type is datetime else ""}'
+            f'"{body_param.alias}":{body_param.alias}.isoformat()'
+            if body_param.needs_isoformat
+            else f'"{body_param.alias}":{body_param.alias}'
             for body_param in self.body_parameters
         )
-        if self.body_parameters:
-            payload_body = textwrap.indent(f"payload = {{{payload_dict}}}", "    ")
-        else:
-            payload_body = textwrap.indent("payload = None", "    ")
-        httpx_body = textwrap.indent(
-            f'api_response = await self._client.request("{self.method}", url, json=payload, params=params)',
-            "    ",
-        )
-        raise_error_body = textwrap.indent("api_response.raise_for_status()", "    ")
-
-        is_list = self.response_signature.startswith("list[")
-        is_dict = self.response_signature.startswith("dict[")
-        if is_list:
-            response_model = self.response_signature[5:-1]
-        elif is_dict:
-            response_model = self.response_signature[5:-1].split(", ")[1]
-        else:
-            response_model = self.response_signature
-        if self.response is not None:
-            response_json_body = textwrap.indent(
-                "response_body = api_response.json()", "    "
-            )
-        else:
-            response_json_body = textwrap.indent(
-                "", "    "
-            )
 
-        asterisk = "**" if self.response_signature != "list[int]" and not self.response_signature.endswith(", list]") else ""
-        if is_dict and self.response_signature.endswith("int]"):
-            asterisk = ""
-        if self.response is None:
-            parse_body = textwrap.indent("return None", "    ")
-        elif is_list:
-            if "Literal" in self.response_signature:
-                parse_body = textwrap.indent(
-                    f"return [resp_object for resp_object in response_body]\n",
-                    "    ",
-                )
-            else:
-                parse_body = textwrap.indent(
-                    f"return [{response_model}({asterisk}resp_object) for resp_object in response_body]\n",
-                    "    ",
-                )
-        elif is_dict:
-            parse_body = textwrap.indent(
-                f"return {{key: {response_model}({asterisk}value) for key, value in response_body.items()}}",
-                "    ",
-            )
+        signature = self.response_signature
+        if signature.kind == "none":
+            result = "    return None"
         else:
-            parse_body = textwrap.indent(
-                f"return {response_model}({asterisk}response_body)", "    "
-            )
+            value = RESULT_VALUES[signature.kind]
+            if signature.inner is not None:
+                value = f"{signature.inner}({'**' if signature.unpack else ''}{value})"
+            if signature.kind == "list":
+                result = RESULT_TEMPLATE.format(f"[{value} for resp_object in response_body]\n")
+            elif signature.kind == "dict":
+                result = RESULT_TEMPLATE.format(f"{{key: {value} for key, value in response_body.items()}}")
+            else:
+                result = RESULT_TEMPLATE.format(value)
 
-        return (
-            signature
-            + docstring
-            + "\n"
-            + url_body
-            + "\n"
-            + params_body
-            + "\n"
-            + payload_body
-            + "\n"
-            + httpx_body
-            + "\n"
-            + raise_error_body
-            + "\n"
-            + response_json_body
-            + "\n"
-            + parse_body
+        return HANDLER_TEMPLATE.format_map(
+            {
+                "name": self.name,
+                "params": params,
+                "signature": signature.text,
+                "docstring": textwrap.indent(f'"""{self.description}"""', "    "),
+                "url": f"f{self.path!r}" if self.path_parameters else repr(self.path),
+                "query": f"{{{query_dict}}}" if self.query_parameters else "None",
+                "payload": f"{{{payload_dict}}}" if self.body_parameters else "None",
+                "method": self.method,
+                "result": result,
+            }
         )
 
     @staticmethod
     def get_method(methods: set) -> METHOD:
-        method_priority: list[METHOD] = [
-            "GET",
-            "POST",
-            "DELETE",
-            "PUT",
-            "PATCH",
-            "HEAD",
-            "OPTIONS",
-        ]
-        for method in method_priority:
-            if method in methods:
-                return method
-        raise ValueError(
-            f"Method not found in {methods}. Expected one of {method_priority}."
-        )
+        known_methods = KNOWN_METHODS.intersection(methods)
+        if not known_methods:
+            raise ValueError(
+                f"Method not found in {methods}. Expected one of {list(METHOD_PRIORITY)}."
+            )
+        return min(known_methods, key=METHOD_PRIORITY.__getitem__)
 
     @classmethod
     def extract(cls, app: FastAPI, paths_to_exclude: list[str] = None) -> list["Route"]:
         routes = []
+        excluded_paths = set(paths_to_exclude or ())
+        undefined = PydanticUndefined
+        parameter_undefined = PARAMETER_UNDEFINED
+
+        def to_parameter(param) -> Parameter:
+            default = param.default
+            return Parameter.intern(
+                param.alias,
+                param.type_,
+                param.required,
+                parameter_undefined if default is undefined else default,
+            )
+
         for index, route in enumerate(app.routes):
             if not isinstance(route, APIRoute):
                 continue
-            if paths_to_exclude and route.path in paths_to_exclude:
+            if route.path in excluded_paths:
                 continue
             name = route.name
             description = route.description
 
             path = route.path
             method = cls.get_method(route.methods)
-            path_parameters = [
-                Parameter(
-                    param.alias,
-                    param.type_,
-                    param.required,
-                    param.default
-                    if param.default is not PydanticUndefined
-                    else PARAMETER_UNDEFINED,
-                )
-                for param in route.dependant.path_params
-            ]
-            query_parameters = [
-                Parameter(
-                    param.alias,
-                    param.type_,
-                    param.required,
-                    param.default
-                    if param.default is not PydanticUndefined
-                    else PARAMETER_UNDEFINED,
-                )
-                for param in route.dependant.query_params
-            ]
+            path_parameters = []
+            query_parameters = []
+            for parameters, params in (
+                (path_parameters, route.dependant.path_params),
+                (query_parameters, route.dependant.query_params),
+            ):
+                append = parameters.append
+                for param in params:
+                    append(to_parameter(param))
 
             body = route.body_field.type_ if route.body_field else None
 